@@ -1,1113 +1,1513 @@
-#!/usr/bin/env python3
-from flask import Flask, request, jsonify, send_file
-from flask_cors import CORS
-import yt_dlp
-import os
-import tempfile
-import threading
-import uuid
-import subprocess
-import shutil
-import time
-import logging
-import random
-from pathlib import Path
-from datetime import datetime, timedelta
-from PIL import Image, ImageDraw, ImageFont, ImageFilter
-import io
-import base64
-import urllib.parse
-import re
-
-YTDL_COOKIES_PATH = os.environ.get('YTDL_COOKIES_PATH')
-
-app = Flask(__name__)
-CORS(app)  # Enable CORS for all routes
-
-# Setup logging
-os.makedirs('logs', exist_ok=True)
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('logs/ytdl.log', encoding='utf-8'),
-        logging.StreamHandler()
-    ]
-)
-logger = logging.getLogger(__name__)
-
-LOG_FILE_PATH = 'logs/ytdl.log'
-LOG_CLEAR_INTERVAL = 10 * 60  # every 10 minutes
-
-def auto_clear_log():
-    while True:
-        try:
-            if os.path.exists(LOG_FILE_PATH):
-                with open(LOG_FILE_PATH, 'w', encoding='utf-8') as f:
-                    f.truncate(0)
-                logger.info("Auto-cleared ytdl.log file to prevent bloat")
-        except Exception as e:
-            logger.error("Error clearing log file: %s", e)
-        time.sleep(LOG_CLEAR_INTERVAL)
-
-# Start background thread for log clearing
-threading.Thread(target=auto_clear_log, daemon=True).start()
-
-# In-memory tracking with thread safety
-download_status = {}
-
-# Thread locks for thread-safe operations
-download_status_lock = threading.Lock()
-
-class DownloadProgress:
-    def __init__(self):
-        self.status = 'queued'
-        self.progress = 0.0
-        self.filename = ''
-        self.error = ''
-        self.temp_dir = ''
-        self.ffmpeg_available = False
-        self.title = ''
-        self.completed = False
-        self.downloaded_bytes = 0
-        self.total_bytes = 0
-        self.speed = 0
-        self.eta = 0
-        self.created_at = datetime.now()  # Track creation time for cleanup
-        self.last_accessed = datetime.now()  # Track last access
-
-def format_duration(seconds):
-    try:
-        seconds = int(seconds)
-    except Exception:
-        return "Unknown"
-    if seconds <= 0:
-        return "00:00"
-    minutes, seconds = divmod(seconds, 60)
-    hours, minutes = divmod(minutes, 60)
-    if hours > 0:
-        return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
-    else:
-        return f"{minutes:02d}:{seconds:02d}"
-
-def format_eta(eta_seconds):
-    """Format ETA seconds into mm:ss format"""
-    try:
-        eta_seconds = int(eta_seconds)
-        if eta_seconds <= 0:
-            return "00:00"
-        minutes = eta_seconds // 60
-        seconds = eta_seconds % 60
-        return f"{minutes:02d}:{seconds:02d}"
-    except Exception:
-        return "00:00"
-
-def bytes_to_mb(bytes_value):
-    """Convert bytes to megabytes with 2 decimal places"""
-    try:
-        return round(bytes_value / (1024 * 1024), 2)
-    except Exception:
-        return 0
-
-def format_file_size(bytes_value):
-    """Convert bytes to human readable format"""
-    try:
-        if bytes_value >= 1024 * 1024 * 1024:
-            return f"{round(bytes_value / (1024 * 1024 * 1024), 1)}GB"
-        elif bytes_value >= 1024 * 1024:
-            return f"{round(bytes_value / (1024 * 1024), 1)}MB"
-        elif bytes_value >= 1024:
-            return f"{round(bytes_value / 1024, 1)}KB"
-        else:
-            return f"{bytes_value}B"
-    except Exception:
-        return "Unknown"
-
-def check_ffmpeg():
-    """Return True if ffmpeg is available."""
-    try:
-        result = subprocess.run(['ffmpeg', '-version'], capture_output=True, text=True, timeout=10)
-        return result.returncode == 0
-    except Exception:
-        return False
-
-def safe_get_job(job_id):
-    """Thread-safe job retrieval with access tracking"""
-    with download_status_lock:
-        job = download_status.get(job_id)
-        if job:
-            job.last_accessed = datetime.now()
-        return job
-
-def safe_set_job(job_id, job):
-    """Thread-safe job setting"""
-    with download_status_lock:
-        download_status[job_id] = job
-
-def safe_remove_job(job_id):
-    """Thread-safe job removal"""
-    with download_status_lock:
-        return download_status.pop(job_id, None)
-
-def progress_hook_factory(job_id):
-    """Return a progress hook function bound to job_id."""
-    def hook(d):
-        job = safe_get_job(job_id)
-        if job is None or job.completed:
-            return
-        
-        status = d.get('status')
-        if status == 'downloading':
-            job.status = 'downloading'
-            
-            # Update progress percentage
-            p = d.get('_percent_str') or d.get('percent')
-            if p:
-                try:
-                    if isinstance(p, str):
-                        p = p.strip().strip('%')
-                    job.progress = min(float(p), 99.9)
-                except Exception:
-                    pass
-            elif d.get('total_bytes') and d.get('downloaded_bytes'):
-                try:
-                    total = d.get('total_bytes') or d.get('total_bytes_estimate', 0)
-                    downloaded = d.get('downloaded_bytes', 0)
-                    if total > 0:
-                        job.progress = min((downloaded / total) * 100, 99.9)
-                except Exception:
-                    pass
-            
-            job.downloaded_bytes = d.get('downloaded_bytes', 0)
-            job.total_bytes = d.get('total_bytes') or d.get('total_bytes_estimate', 0)
-            job.speed = d.get('speed', 0)
-            job.eta = d.get('eta', 0)
-            
-        elif status == 'finished':
-            if not job.completed:
-                job.progress = 99.9
-                job.downloaded_bytes = job.total_bytes
-                job.speed = 0
-                job.eta = 0
-            if 'filename' in d:
-                try:
-                    job.filename = os.path.abspath(d['filename'])
-                except Exception:
-                    job.filename = d['filename']
-            logger.info("Progress hook finished for job %s: %s", job_id, d.get('filename', ''))
-        elif status == 'error':
-            if not job.completed:
-                job.status = 'error'
-                job.error = d.get('error', 'Unknown error reported by yt-dlp')
-                logger.error("Progress hook error for job %s: %s", job_id, job.error)
-    return hook
-
-def find_final_file_in_dir(temp_dir, title_hint=None):
-    """Return the best candidate file path inside temp_dir."""
-    if not temp_dir or not os.path.isdir(temp_dir):
-        return None
-    
-    try:
-        files = [
-            os.path.join(temp_dir, f) 
-            for f in os.listdir(temp_dir) 
-            if os.path.isfile(os.path.join(temp_dir, f))
-        ]
-    except Exception as e:
-        logger.error("Error listing temp_dir %s: %s", temp_dir, e)
-        return None
-    
-    if not files:
-        return None
-    
-    files = [f for f in files if not f.endswith('.part')]
-    
-    if not files:
-        return None
-    
-    if title_hint:
-        normalized = title_hint.replace('/', '_').replace('\\', '_').strip()
-        matches = [f for f in files if os.path.basename(f).startswith(normalized)]
-        if matches:
-            matches.sort(key=lambda p: os.path.getsize(p) if os.path.exists(p) else 0, reverse=True)
-            return matches[0]
-    
-    files.sort(key=lambda p: os.path.getsize(p) if os.path.exists(p) else 0, reverse=True)
-    return files[0]
-
-def validate_format_string(format_str):
-    if not format_str or not isinstance(format_str, str):
-        return False
-    format_str = format_str.strip()
-    allowed_chars = set('abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789[]+/._-!=*?,')
-    if not all(c in allowed_chars for c in format_str):
-        return False
-    if len(format_str) > 100:  
-        return False
-    # Disallow suspicious sequences
-    if '..' in format_str:
-        return False
-    # Maybe allow single slash but not double
-    if '//' in format_str:
-        return False
-    return True
-
-
-def get_available_formats(url):
-    """Get available formats for a YouTube URL"""
-    try:
-        ydl_opts = {
-            'quiet': True,
-            'no_warnings': True,
-            'skip_download': True,
-        }
-        if YTDL_COOKIES_PATH and os.path.exists(YTDL_COOKIES_PATH):
-            cleaned_cookies = clean_cookies_file(YTDL_COOKIES_PATH)
-            ydl_opts['cookiefile'] = cleaned_cookies if cleaned_cookies else YTDL_COOKIES_PATH
-        
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=False)
-            return info.get('formats', []) if isinstance(info, dict) else []
-    except Exception as e:
-        logger.error("Error getting available formats: %s", e)
-        return []
-
-def is_format_available(url, requested_format):
-    """Check if the requested format is available for the given video"""
-    try:
-        ydl_opts = {
-            'quiet': True,
-            'no_warnings': True,
-            'skip_download': True,
-        }
-        
-        # Use cookies if available
-        if YTDL_COOKIES_PATH and os.path.exists(YTDL_COOKIES_PATH):
-            cleaned_cookies = clean_cookies_file(YTDL_COOKIES_PATH)
-            ydl_opts['cookiefile'] = cleaned_cookies if cleaned_cookies else YTDL_COOKIES_PATH
-        
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            # Get all available formats
-            info = ydl.extract_info(url, download=False)
-            formats = info.get('formats', []) if isinstance(info, dict) else []
-            
-            # For audio formats, check if any audio format exists
-            if 'bestaudio' in requested_format:
-                audio_formats = [f for f in formats if f.get('acodec') != 'none']
-                return len(audio_formats) > 0
-            
-            # For video formats, check if the requested resolution range is available
-            if 'height<=' in requested_format:
-                height_match = re.search(r'height<=(\d+)', requested_format)
-                if height_match:
-                    max_height = int(height_match.group(1))
-                    video_formats = [f for f in formats if f.get('height') and f.get('height') <= max_height and f.get('vcodec') != 'none']
-                    return len(video_formats) > 0
-            
-            # If we can't parse the format, assume it's available and let yt-dlp handle fallbacks
-            return True
-            
-    except Exception as e:
-        logger.error("Error checking format availability: %s", e)
-        # If we can't check, assume it's available and let the download attempt handle it
-        return True
-
-def clean_cookies_file(cookies_path):
-    """Clean and fix cookies file to ensure Netscape format compatibility"""
-    try:
-        if not os.path.exists(cookies_path):
-            return None
-        
-        # Create unique temp file to avoid race conditions
-        temp_cookies = os.path.join('/tmp', f'cookies_cleaned_{uuid.uuid4().hex}.txt')
-        
-        with open(cookies_path, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
-        
-        # Filter and clean lines
-        cleaned_lines = []
-        seen_header = False
-        
-        for line in lines:
-            stripped = line.strip()
-            
-            # Keep only the first Netscape header line
-            if 'Netscape HTTP Cookie File' in line and not seen_header:
-                cleaned_lines.append('# Netscape HTTP Cookie File\n')
-                seen_header = True
-                continue
-            
-            # Skip other comment lines except the main header
-            if stripped.startswith('#'):
-                if 'Netscape HTTP Cookie File' in line:
-                    continue  # Already added
-                # Skip other comments like the curl.haxx.se line
-                continue
-            
-            # Skip empty lines at the start
-            if not stripped and not cleaned_lines:
-                continue
-            
-            # Keep cookie lines and one empty line after header
-            if stripped or (cleaned_lines and not cleaned_lines[-1].strip()):
-                cleaned_lines.append(line)
-        
-        with open(temp_cookies, 'w', encoding='utf-8') as f:
-            f.writelines(cleaned_lines)
-        
-        logger.info("Created cleaned cookies file: %s", temp_cookies)
-        return temp_cookies
-        
-    except Exception as e:
-        logger.error("Error cleaning cookies file: %s", e)
-        # If cleaning fails, try to use original
-        return cookies_path
-
-def get_ytdlp_opts_with_retry(temp_dir, job_id, format_str, file_ext, ffmpeg_available):
-    """Get yt-dlp options optimized for Render.com to avoid SABR and signature issues"""
-    
-    # Base options optimized for stability
-    base_opts = {
-        'outtmpl': os.path.join(temp_dir, '%(title)s.%(ext)s'),
-        'progress_hooks': [progress_hook_factory(job_id)],
-        'restrictfilenames': False,
-        'quiet': False,
-        'no_warnings': False,
-        'nopart': False,
-        'noplaylist': True,
-        'extractor_retries': 3,
-        'retries': 10,
-        'fragment_retries': 10,
-        'skip_unavailable_fragments': True,
-        'continuedl': True,
-        'age_limit': None,
-        'playlist_items': '1',
-        'allow_unplayable_formats': False,
-        'ignore_no_formats_error': True,  # Changed to True to ignore format errors
-        'format_sort': ['res', 'ext:mp4:m4a'],
-        'merge_output_format': 'mp4',
-        
-        # CRITICAL: Force Android client only to avoid SABR streaming
-        'extractor_args': {
-            'youtube': {
-                'player_client': ['android'],  # Only android, no web/safari
-                'player_skip': ['js', 'configs', 'webpage'],
-            }
-        },
-        
-        # Enhanced format selection with safe fallbacks
-        'format': 'bv*[vcodec^=avc1]+ba[acodec^=mp4a] / bv*+ba/best[height<=1080] / best',
-        
-        # HTTP settings optimized for Render
-        'http_headers': {
-            'User-Agent': 'Mozilla/5.0 (Linux; Android 13; SM-G991B) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/112.0.0.0 Mobile Safari/537.36',
-            'Accept': '*/*',
-            'Accept-Language': 'en-US,en;q=0.9',
-            'Accept-Encoding': 'gzip, deflate, br',
-            'Connection': 'keep-alive',
-        },
-        
-        # Anti-bot measures
-        'sleep_interval': 2,
-        'max_sleep_interval': 8,
-        'throttled_rate': '512K',
-        
-        # Error handling
-        'ignoreerrors': True,  # Continue on minor errors
-        'no_check_certificate': True,
-        'prefer_insecure': False,
-    }
-
-    # Cookies handling - simplified for Render
-    cookies_loaded = False
-    if YTDL_COOKIES_PATH and os.path.exists(YTDL_COOKIES_PATH):
-        try:
-            cleaned_cookies = clean_cookies_file(YTDL_COOKIES_PATH)
-            if cleaned_cookies:
-                base_opts['cookiefile'] = cleaned_cookies
-                logger.info("✅ Using cleaned cookies file: %s for job %s", cleaned_cookies, job_id)
-                cookies_loaded = True
-        except Exception as e:
-            logger.error("Failed to set cookiefile: %s", e)
-    
-    # REMOVED cookiesfrombrowser completely - Render doesn't have Chrome
-    
-    # Format-specific configuration
-    try:
-        if file_ext == 'mp3':
-    if ffmpeg_available:
-        base_opts.update({
-            'format': 'bestaudio/best',
-            'postprocessors': [{ … }],
-        })
-    else:
-        base_opts['format'] = 'bestaudio[ext=m4a]'  # remove the fallback slash
-else:
-    if format_str and validate_format_string(format_str):
-        format_with_fallback = f"{format_str}/bv*[height<=1080]+ba/b[height<=720]/best[height<=1080]/best"
-        base_opts['format'] = format_with_fallback
-        logger.info("Job %s - using enhanced format with fallback: %s", job_id, format_with_fallback)
-    else:
-        base_opts['format'] = 'bv*[vcodec^=avc1][height<=1080]+ba[acodec^=mp4a] / bv*[height<=1080]+ba / best[height<=1080] / best'
-        logger.info("Job %s - using default android-optimized format", job_id)
-
-            
-    except Exception as e:
-        logger.exception("Job %s - error building format options: %s", job_id, e)
-        # Ultimate fallback - let yt-dlp choose the best available
-        base_opts['format'] = 'best'
-        base_opts['ignoreerrors'] = True
-
-    return base_opts
-
-def get_fallback_ydl_opts(temp_dir, job_id):
-    """Ultimate fallback options when everything else fails"""
-    return {
-        'outtmpl': os.path.join(temp_dir, '%(title)s.%(ext)s'),
-        'format': 'best',
-        'ignoreerrors': True,
-        'no_warnings': False,
-        'extractor_args': {
-            'youtube': {
-                'player_client': ['android'],
-            }
-        },
-        'http_headers': {
-            'User-Agent': 'Mozilla/5.0 (Linux; Android 13) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/112.0.0.0 Mobile Safari/537.36',
-        },
-    }
-
-def handle_download_error(job, job_id, error, retry_count, max_retries):
-    """Handle download errors with appropriate retry logic"""
-    error_msg = str(error)
-    logger.warning("Job %s - DownloadError (attempt %d/%d): %s", job_id, retry_count + 1, max_retries, error_msg)
-    
-    if "sign in to confirm" in error_msg.lower() or "confirm you're not a bot" in error_msg.lower():
-        job.status = 'error'
-        job.error = '🤖 Bot detection triggered. Please ensure cookies.txt is uploaded and YTDL_COOKIES_PATH is configured correctly.'
-        job.completed = True
-        logger.error("❌ Bot detection error - cookies may be missing or invalid")
-        return False
-    
-    non_retryable_errors = [
-        "requested format is not available",
-        "private video", 
-        "video unavailable",
-        "this video is not available",
-        "no video formats found",
-        "this video is private"
-    ]
-    
-    for msg in non_retryable_errors:
-        if msg in error_msg.lower():
-            job.status = 'error'
-            if "requested format is not available" in error_msg.lower():
-                job.error = 'The requested quality is not available for this video. Please try a lower quality.'
-            elif "private video" in error_msg.lower():
-                job.error = 'This video is private and cannot be downloaded.'
-            elif "video unavailable" in error_msg.lower():
-                job.error = 'This video is unavailable.'
-            else:
-                job.error = f'Download failed: {error_msg}'
-            job.completed = True
-            return False
-    
-    retryable_errors = [
-        "http error 403",
-        "http error 429", 
-        "forbidden",
-        "too many requests",
-        "age restricted",
-        "rate limit"
-    ]
-    
-    for msg in retryable_errors:
-        if msg in error_msg.lower():
-            if retry_count < max_retries - 1:  # Fixed: don't double increment
-                wait_time = min(2 ** (retry_count + 1), 30)
-                logger.info("Job %s - %s error, waiting %d seconds before retry %d", 
-                           job_id, msg.upper(), wait_time, retry_count + 2)
-                time.sleep(wait_time)
-                return True
-            else:
-                job.status = 'error'
-                job.error = 'YouTube is blocking downloads. Please ensure cookies are properly configured.'
-                job.completed = True
-                return False
-    
-    job.status = 'error'
-    job.error = f'Download failed: {error_msg}'
-    job.completed = True
-    return False
-
-def download_worker(url, format_str, file_ext, job_id):
-    job = safe_get_job(job_id)
-    if job is None:
-        logger.error("Download worker called with missing job_id: %s", job_id)
-        return
-
-    temp_dir = tempfile.mkdtemp(prefix=f'ytdl_{uuid.uuid4().hex}_')
-    job.temp_dir = temp_dir
-    job.ffmpeg_available = check_ffmpeg()
-    logger.info("Job %s - temp_dir: %s - ffmpeg_available: %s", job_id, temp_dir, job.ffmpeg_available)
-
-    job.status = 'downloading'
-    job.progress = 0.0
-    job.downloaded_bytes = 0
-    job.total_bytes = 0
-    job.speed = 0
-    job.eta = 0
-    
-    max_retries = 3
-    retry_count = 0
-    
-    while retry_count < max_retries:
-        try:
-            ydl_opts = get_ytdlp_opts_with_retry(temp_dir, job_id, format_str, file_ext, job.ffmpeg_available)
-            
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=True)
-                title = info.get('title') if isinstance(info, dict) else None
-                if title:
-                    job.title = title
-
-                time.sleep(1)
-
-                final = None
-                
-                if job.filename and os.path.exists(job.filename):
-                    final = job.filename
-
-                if not final:
-                    try:
-                        if isinstance(info, dict):
-                            candidate = ydl.prepare_filename(info)
-                            if os.path.exists(candidate):
-                                final = candidate
-                    except Exception:
-                        pass
-
-                if not final:
-                    candidate = find_final_file_in_dir(temp_dir, title_hint=job.title)
-                    if candidate:
-                        final = candidate
-
-                if not final and isinstance(info, dict):
-                    req = info.get('requested_downloads')
-                    if req and isinstance(req, list):
-                        for r in req:
-                            p = r.get('filepath') or r.get('path')
-                            if p and os.path.exists(p):
-                                final = p
-                                break
-
-                if final:
-                    final = os.path.abspath(final)
-                    job.filename = final
-                    job.status = 'completed'
-                    job.progress = 100.0
-                    job.completed = True
-                    
-                    try:
-                        file_size = os.path.getsize(final)
-                        job.downloaded_bytes = file_size
-                        job.total_bytes = file_size
-                    except Exception:
-                        pass
-                    
-                    try:
-                        size = os.path.getsize(final)
-                        # More reasonable minimum file size check
-                        if size < 1024:  # 1KB minimum
-                            job.status = 'error'
-                            job.error = 'Downloaded file is too small or corrupted'
-                            logger.error("Job %s - file too small: %s (%d bytes)", job_id, final, size)
-                    except Exception as e:
-                        logger.error("Job %s - error checking file size: %s", job_id, e)
-                    
-                    logger.info("✅ Job %s - download completed: %s", job_id, final)
-                    break
-                else:
-                    job.status = 'error'
-                    job.error = 'Could not determine final output filename'
-                    job.completed = True
-                    logger.error("Job %s - final file not found in %s", job_id, temp_dir)
-                    break
-
-        except yt_dlp.utils.DownloadError as e:
-            should_retry = handle_download_error(job, job_id, e, retry_count, max_retries)
-            if should_retry:
-                retry_count += 1
-                continue
-            else:
-                break
-
-        except Exception as e:
-            logger.exception("Job %s - unexpected exception (attempt %d/%d): %s", job_id, retry_count + 1, max_retries, e)
-            retry_count += 1
-            if retry_count < max_retries:
-                time.sleep(2)
-                continue
-            else:
-                job.status = 'error'
-                job.error = f'Unexpected error: {str(e)}'
-                job.completed = True
-                break
-
-    if job.status == 'error' and job.temp_dir and os.path.exists(job.temp_dir):
-        try:
-            shutil.rmtree(job.temp_dir)
-            logger.info("Cleaned up temp directory for failed job %s", job_id)
-        except Exception as e:
-            logger.error("Error cleaning up temp dir for job %s: %s", job_id, e)
-
-def extract_video_id(url):
-    """Extract YouTube video ID from various URL formats"""
-    try:
-        # Handle different YouTube URL formats
-        patterns = [
-            r'(?:youtube\.com\/watch\?v=|youtu\.be\/|youtube\.com\/embed\/)([a-zA-Z0-9_-]{11})',
-            r'youtube\.com\/watch\?.*?v=([a-zA-Z0-9_-]{11})',
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, url)
-            if match:
-                return match.group(1)
-        
-        # If no pattern matches, return None
-        return None
-    except Exception as e:
-        logger.error("Error extracting video ID from URL %s: %s", url, e)
-        return None
-
-def cleanup_old_jobs():
-    """Remove old jobs and their temp directories"""
-    try:
-        now = datetime.now()
-        expired_jobs = []
-        
-        with download_status_lock:
-            for job_id, job in download_status.items():
-                # Remove jobs older than 1 hour or completed jobs older than 30 minutes
-                if (now - job.created_at).total_seconds() > 3600 or \
-                   (job.completed and (now - job.last_accessed).total_seconds() > 1800):
-                    expired_jobs.append((job_id, job))
-        
-        for job_id, job in expired_jobs:
-            if job.temp_dir and os.path.exists(job.temp_dir):
-                try:
-                    shutil.rmtree(job.temp_dir)
-                    logger.info("Cleanup removed temp_dir %s for expired job %s", job.temp_dir, job_id)
-                except Exception as e:
-                    logger.error("Error removing temp dir %s: %s", job.temp_dir, e)
-            safe_remove_job(job_id)
-            
-        if expired_jobs:
-            logger.info("Cleaned up %d expired jobs", len(expired_jobs))
-            
-    except Exception as e:
-        logger.error("Error in cleanup_old_jobs: %s", e)
-
-@app.route('/api/ffmpeg-status')
-def get_ffmpeg_status():
-    return jsonify({'ffmpeg_available': check_ffmpeg()})
-
-class TimeoutException(Exception):
-    pass
-
-def extract_video_info_with_timeout(url, ydl_opts, timeout_seconds=30):
-    """Extract video info with timeout using threading (replaces signal-based timeout)"""
-    import queue
-    
-    result_queue = queue.Queue()
-    exception_queue = queue.Queue()
-    
-    def worker():
-        try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=False)
-                result_queue.put(info)
-        except Exception as e:
-            exception_queue.put(e)
-    
-    thread = threading.Thread(target=worker)
-    thread.daemon = True
-    thread.start()
-    thread.join(timeout_seconds)
-    
-    if thread.is_alive():
-        raise TimeoutException(f"Video info extraction timed out after {timeout_seconds} seconds")
-    
-    if not exception_queue.empty():
-        raise exception_queue.get()
-    
-    if not result_queue.empty():
-        return result_queue.get()
-    
-    raise Exception("Unknown error in video info extraction")
-
-@app.route('/api/video-info', methods=['POST'])
-def get_video_info():
-    data = request.get_json() or {}
-    url = data.get('url')
-    if not url:
-        return jsonify({'error': 'URL is required'}), 400
-    
-    # Basic URL validation
-    if not url.startswith(('http://', 'https://')):
-        return jsonify({'error': 'Invalid URL format'}), 400
-    
-    try:
-        ydl_opts = {
-            'quiet': False,
-            'no_warnings': False,
-            'skip_download': True,
-            'socket_timeout': 30,
-            'extract_flat': False,
-            'ignoreerrors': False,
-            'no_color': True,
-            'http_headers': {
-                'User-Agent': 'Mozilla/5.0 (Linux; Android 13; SM-G991B) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/112.0.0.0 Mobile Safari/537.36',
-                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-                'Accept-Language': 'en-us,en;q=0.5',
-                'Accept-Encoding': 'gzip,deflate',
-                'Connection': 'keep-alive',
-            },
-        }
-        
-        if YTDL_COOKIES_PATH and os.path.exists(YTDL_COOKIES_PATH):
-            cleaned_cookies = clean_cookies_file(YTDL_COOKIES_PATH)
-            ydl_opts['cookiefile'] = cleaned_cookies if cleaned_cookies else YTDL_COOKIES_PATH
-            logger.info("Using cookies from: %s", ydl_opts['cookiefile'])
-        
-        # Try with timeout
-        try:
-            info = extract_video_info_with_timeout(url, ydl_opts, timeout_seconds=25)
-        except TimeoutException:
-            logger.error("Video info extraction timed out for URL: %s", url)
-            return jsonify({
-                'error': 'YouTube is taking too long to respond. This video may be heavily restricted. Please try a different video.',
-                'suggestion': 'Try using a video that is publicly available and not age-restricted'
-            }), 408  # 408 Request Timeout
-        
-        formats = []
-        for f in info.get('formats', []) if isinstance(info, dict) else []:
-            if f.get('format_id'):
-                # Calculate file size
-                filesize = f.get('filesize') or f.get('filesize_approx')
-                if filesize:
-                    filesize_display = format_file_size(filesize)
-                else:
-                    filesize_display = None
-                
-                # Determine format type
-                is_audio = f.get('acodec') != 'none' and f.get('vcodec') == 'none'
-                format_type = 'audio' if is_audio else 'video'
-                
-                # Get resolution/quality info
-                resolution = None
-                if f.get('height'):
-                    resolution = f"{f.get('height')}p"
-                elif f.get('format_note'):
-                    resolution = f.get('format_note')
-                
-                # Get audio bitrate if available
-                abr = f.get('abr')
-                if abr:
-                    quality = f"{abr}kbps"
-                else:
-                    quality = resolution or 'Best Quality'
-                
-                formats.append({
-                    'format_id': f.get('format_id'),
-                    'ext': f.get('ext', ''),
-                    'resolution': resolution,
-                    'quality': quality,
-                    'filesize': filesize_display,
-                    'filesize_bytes': filesize,
-                    'vcodec': f.get('vcodec', 'none'),
-                    'acodec': f.get('acodec', 'none'),
-                    'format_note': f.get('format_note', ''),
-                    'fps': f.get('fps'),
-                    'type': format_type
-                })
-        
-        # Escape HTML characters in title to prevent XSS
-        title = info.get('title', 'Unknown')
-        if isinstance(title, str):
-            title = (title.replace('&', '&amp;')
-                    .replace('<', '&lt;')
-                    .replace('>', '&gt;')
-                    .replace('"', '&quot;')
-                    .replace("'", '&#039;'))
-        
-        video_info = {
-            'title': title,
-            'duration': format_duration(info.get('duration', 0)),
-            'thumbnail': info.get('thumbnail', ''),
-            'channel': info.get('uploader', 'Unknown'),
-            'view_count': info.get('view_count', 0),
-            'formats': formats
-        }
-        
-        # Check if we have any downloadable formats
-        downloadable_formats = [f for f in formats if f.get('vcodec') != 'none' or f.get('acodec') != 'none']
-        if not downloadable_formats:
-            video_info['warning'] = 'No downloadable formats available. This video may be restricted.'
-        
-        return jsonify(video_info)
-        
-    except yt_dlp.utils.DownloadError as e:
-        error_msg = str(e)
-        logger.error("DownloadError fetching video info: %s", error_msg)
-        
-        # Handle specific YouTube restrictions
-        if "signature extraction failed" in error_msg.lower():
-            return jsonify({
-                'error': 'YouTube signature extraction failed. This video is heavily restricted.',
-                'suggestion': 'Try using a different video or ensure your cookies are properly configured'
-            }), 423  # 423 Locked
-        
-        elif "requested format is not available" in error_msg.lower():
-            return jsonify({
-                'error': 'No downloadable formats available for this video.',
-                'suggestion': 'This video may be age-restricted, region-locked, or otherwise restricted by YouTube'
-            }), 404
-        
-        elif "video unavailable" in error_msg.lower():
-            return jsonify({
-                'error': 'This video is unavailable.',
-                'suggestion': 'The video may have been removed or made private'
-            }), 404
-        
-        else:
-            return jsonify({
-                'error': 'YouTube is restricting access to this video.',
-                'details': 'Please try a different video or check if the video is publicly available'
-            }), 403
-        
-    except Exception as e:
-        error_msg = str(e)
-        logger.exception("Unexpected error fetching video info: %s", error_msg)
-        return jsonify({
-            'error': 'Failed to fetch video information.',
-            'suggestion': 'Please try again with a different video URL'
-        }), 500
-
-@app.route('/api/download', methods=['POST'])
-def download_video():
-    """Download endpoint without CAPTCHA verification"""
-    data = request.get_json() or {}
-    url = data.get('url')
-    format_str = data.get('format')
-    file_ext = data.get('file_ext', 'mp4')
-
-    if not url or not format_str:
-        return jsonify({'error': 'URL and format are required'}), 400
-    
-    # Basic URL validation
-    if not url.startswith(('http://', 'https://')):
-        return jsonify({'error': 'Invalid URL format'}), 400
-    
-    if not validate_format_string(format_str):
-        logger.warning("Invalid format string rejected: %s", format_str)
-        return jsonify({'error': 'Invalid format specification'}), 400
-    
-    allowed_extensions = ['mp4', 'mp3']
-    if file_ext not in allowed_extensions:
-        return jsonify({'error': f'Invalid file extension. Allowed: {", ".join(allowed_extensions)}'}), 400
-
-    try:
-        # Check if format is available, but don't block if check fails
-        if not is_format_available(url, format_str):
-            logger.warning("Format %s may not be available for URL: %s", format_str, url)
-    except Exception as e:
-        logger.warning("Could not check format availability: %s", e)
-
-    job_id = str(uuid.uuid4())
-    job = DownloadProgress()
-    job.ffmpeg_available = check_ffmpeg()
-    safe_set_job(job_id, job)
-
-    logger.info("Processing download for URL %s with job %s", url, job_id)
-
-    t = threading.Thread(target=download_worker, args=(url, format_str, file_ext, job_id), daemon=True)
-    t.start()
-
-    return jsonify({'job_id': job_id, 'ffmpeg_available': job.ffmpeg_available})
-
-@app.route('/api/download-status/<job_id>')
-def get_download_status(job_id):
-    job = safe_get_job(job_id)
-    if job is None:
-        return jsonify({'error': 'Download job not found'}), 404
-    
-    response_data = {
-        'status': job.status,
-        'progress': job.progress,
-        'filename': job.filename,
-        'error': job.error,
-        'ffmpeg_available': job.ffmpeg_available,
-        'temp_dir': job.temp_dir,
-        'downloaded_bytes': job.downloaded_bytes,
-        'total_bytes': job.total_bytes,
-        'speed': job.speed,
-        'eta': job.eta,
-        'downloaded_mb': bytes_to_mb(job.downloaded_bytes),
-        'total_mb': bytes_to_mb(job.total_bytes),
-        'speed_mb': bytes_to_mb(job.speed),
-        'eta_formatted': format_eta(job.eta)
-    }
-    
-    return jsonify(response_data)
-
-@app.route('/api/download-file/<job_id>')
-def download_file(job_id):
-    job = safe_get_job(job_id)
-    if job is None:
-        return jsonify({'error': 'Download job not found'}), 404
-
-    if job.status != 'completed':
-        return jsonify({'error': 'File not ready', 'status': job.status, 'error_detail': job.error}), 400
-
-    filename = job.filename
-    if not filename or not os.path.exists(filename):
-        candidate = find_final_file_in_dir(job.temp_dir, title_hint=job.title)
-        if candidate:
-            filename = candidate
-
-    if not filename or not os.path.exists(filename):
-        return jsonify({'error': 'File not found on server'}), 404
-
-    # Security check: ensure file is within temp directory
-    try:
-        filename = os.path.abspath(filename)
-        temp_dir = os.path.abspath(job.temp_dir)
-        if not filename.startswith(temp_dir):
-            logger.error("Security violation: file %s not in temp dir %s", filename, temp_dir)
-            return jsonify({'error': 'Invalid file path'}), 403
-    except Exception as e:
-        logger.error("Error validating file path: %s", e)
-        return jsonify({'error': 'File path validation failed'}), 500
-
-    original_filename = os.path.basename(filename)
-    ext = os.path.splitext(original_filename)[1].lower().lstrip('.')
-    mime_types = {
-        'mp4': 'video/mp4',
-        'mp3': 'audio/mpeg'
-    }
-    mimetype = mime_types.get(ext, 'application/octet-stream')
-
-    def schedule_cleanup_job(job_id_inner):
-        time.sleep(300)  # 5 minutes delay
-        j = safe_get_job(job_id_inner)
-        if j and j.temp_dir and os.path.exists(j.temp_dir):
-            try:
-                shutil.rmtree(j.temp_dir)
-                logger.info("Scheduled cleanup removed %s for job %s", j.temp_dir, job_id_inner)
-            except Exception as e:
-                logger.error("Error removing temp dir %s: %s", j.temp_dir, e)
-        safe_remove_job(job_id_inner)
-
-    threading.Thread(target=schedule_cleanup_job, args=(job_id,), daemon=True).start()
-
-    return send_file(filename, as_attachment=True, download_name=original_filename, mimetype=mimetype)
-
-def schedule_cleanup():
-    """Run cleanup tasks periodically"""
-    cleanup_old_jobs()
-    # Reschedule itself
-    threading.Timer(1800, schedule_cleanup).start()  # Every 30 minutes
-
-@app.route('/')
-def health_check():
-    """Health check endpoint with cookie status"""
-    cookie_status = "✅ Configured" if (YTDL_COOKIES_PATH and os.path.exists(YTDL_COOKIES_PATH)) else "❌ Not found"
-    
-    # Read first few lines of cookies file for debugging
-    cookie_preview = None
-    if YTDL_COOKIES_PATH and os.path.exists(YTDL_COOKIES_PATH):
-        try:
-            with open(YTDL_COOKIES_PATH, 'r', encoding='utf-8') as f:
-                lines = f.readlines()[:5]  # First 5 lines
-                cookie_preview = ''.join(lines)
-        except Exception as e:
-            cookie_preview = f"Error reading file: {e}"
-    
-    return jsonify({
-        'status': 'healthy',
-        'service': 'YTDL API Server',
-        'timestamp': datetime.now().isoformat(),
-        'cookies_configured': bool(YTDL_COOKIES_PATH and os.path.exists(YTDL_COOKIES_PATH)),
-        'cookies_path': YTDL_COOKIES_PATH or 'Not set',
-        'cookies_preview': cookie_preview,
-        'ffmpeg_available': check_ffmpeg(),
-        'active_jobs': len(download_status)
-    })
-
-@app.route('/api/debug-cookies')
-def debug_cookies():
-    """Debug endpoint to check cookies file"""
-    if not YTDL_COOKIES_PATH:
-        return jsonify({'error': 'YTDL_COOKIES_PATH not set'}), 400
-    
-    if not os.path.exists(YTDL_COOKIES_PATH):
-        return jsonify({'error': f'File not found: {YTDL_COOKIES_PATH}'}), 404
-    
-    try:
-        with open(YTDL_COOKIES_PATH, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        lines = content.split('\n')
-        
-        return jsonify({
-            'file_path': YTDL_COOKIES_PATH,
-            'file_size': len(content),
-            'total_lines': len(lines),
-            'first_10_lines': lines[:10],
-            'has_netscape_header': 'Netscape' in content[:200],
-            'has_tabs': '\t' in content,
-            'encoding': 'utf-8'
-        })
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-if __name__ == '__main__':
-    print("\n" + "="*60)
-    print("🚀 YTDL API Server Starting...")
-    print("="*60)
-    
-    ffmpeg_available = check_ffmpeg()
-    if not ffmpeg_available:
-        logger.warning("FFmpeg not found - some features will be limited.")
-        print("⚠️  Warning: FFmpeg not found. Some features may be limited.")
-    else:
-        logger.info("FFmpeg available - full functionality enabled.")
-        print("✅ FFmpeg is available - Full functionality enabled")
-
-    if YTDL_COOKIES_PATH:
-        if os.path.exists(YTDL_COOKIES_PATH):
-            print(f"✅ Cookies file found: {YTDL_COOKIES_PATH}")
-            logger.info("✅ Cookies file configured and found: %s", YTDL_COOKIES_PATH)
-        else:
-            print(f"❌ Cookies file NOT found at: {YTDL_COOKIES_PATH}")
-            print("   Please upload cookies.txt to fix bot detection errors!")
-            logger.error("❌ YTDL_COOKIES_PATH set but file not found: %s", YTDL_COOKIES_PATH)
-    else:
-        print("❌ YTDL_COOKIES_PATH not set in environment variables")
-        print("   Bot detection errors are likely - please configure cookies!")
-        logger.warning("❌ YTDL_COOKIES_PATH environment variable not set")
-
-    # Start cleanup scheduler
-    schedule_cleanup()
-
-    port = int(os.environ.get('PORT', 5000))
-    
-    print(f"\n✅ YTDL API Server starting on port {port}")
-    print("="*60 + "\n")
-    logger.info(f"YTDL API Server starting on port {port}")
-    
-    app.run(debug=False, host='0.0.0.0', port=port, use_reloader=False)
-
-
+#!/usr/bin/env python3
+from flask import Flask, request, jsonify, send_file, Response, stream_with_context
+from flask.json.provider import DefaultJSONProvider
+from flask_cors import CORS
+import yt_dlp
+import os
+import sys
+import subprocess
+import tempfile
+import threading
+import concurrent.futures
+import heapq
+import itertools
+import uuid
+import secrets
+import shutil
+import copy
+import time
+import logging
+import logging.handlers
+from datetime import datetime
+from collections import namedtuple
+from urllib.parse import quote
+import re
+import html
+import atexit
+
+YTDL_COOKIES_PATH = os.environ.get('YTDL_COOKIES_PATH')
+
+# Staged downloads live for seconds before being served and deleted, so
+# prefer a tmpfs-backed root (RAM/page cache) over a physical disk.
+# Override with YTDL_TMP.
+TMP_ROOT = os.environ.get(
+    'YTDL_TMP',
+    '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+)
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is in requirements.txt
+    orjson = None
+
+app = Flask(__name__)
+CORS(app)  # Enable CORS for all routes
+
+# When a fronting proxy (Apache mod_xsendfile, or nginx with the
+# X-Sendfile module) handles file delivery, send_file emits only the
+# X-Sendfile header and the proxy streams the bytes - the Python worker
+# is freed immediately. Off by default: with no proxy configured the
+# header would reach the client as an empty response.
+app.config['USE_X_SENDFILE'] = os.environ.get('YTDL_USE_X_SENDFILE', '').lower() in ('1', 'true', 'yes')
+
+# Behind nginx, set this to the internal location aliased to TMP_ROOT
+# (e.g. /internal-downloads) and download_file answers with an
+# X-Accel-Redirect header instead of streaming the body itself. Unset
+# by default: send_file remains the fallback for dev and Render.
+XACCEL_PREFIX = os.environ.get('YTDL_XACCEL_PREFIX')
+
+class OrjsonProvider(DefaultJSONProvider):
+    """JSON provider backed by orjson's C encoder."""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+# /api/video-info ships a large formats list and /api/download-status is
+# polled every second; orjson serializes both several times faster than
+# the stdlib encoder.
+if orjson is not None:
+    app.json = OrjsonProvider(app)
+
+# Setup logging
+os.makedirs('logs', exist_ok=True)
+
+LOG_FILE_PATH = 'logs/ytdl.log'
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_BACKUP_COUNT = 1
+
+class CachedTimeFormatter(logging.Formatter):
+    """Formatter that reuses the rendered timestamp within the same second.
+
+    asctime formatting calls strftime per record, which dominates the cost
+    of a log line on busy paths (progress hooks, per-job logging). Records
+    are deliberately stamped at second granularity.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._last_second = None
+        self._last_asctime = ''
+
+    def formatTime(self, record, datefmt=None):
+        second = int(record.created)
+        if second != self._last_second:
+            self._last_asctime = super().formatTime(record, datefmt)
+            self._last_second = second
+        return self._last_asctime
+
+# Rotation inside the logging framework keeps the log bounded without the
+# old truncation thread (which raced with in-flight writes).
+logging.basicConfig(
+    level=logging.INFO,
+    handlers=[
+        logging.handlers.RotatingFileHandler(
+            LOG_FILE_PATH, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding='utf-8'
+        ),
+        logging.StreamHandler()
+    ]
+)
+_log_formatter = CachedTimeFormatter(
+    '%(asctime)s - %(levelname)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S'
+)
+for _handler in logging.getLogger().handlers:
+    _handler.setFormatter(_log_formatter)
+logger = logging.getLogger(__name__)
+
+# In-memory tracking with thread safety
+download_status = {}
+
+# Thread locks for thread-safe operations
+download_status_lock = threading.Lock()
+
+# Coalesce duplicate requests: (url, format, ext) -> job_id of the
+# download already in flight. Guarded by download_status_lock.
+_inflight_downloads = {}
+
+# Bounded worker pool so a burst of requests can't spawn unlimited
+# concurrent yt-dlp downloads.
+DOWNLOAD_POOL = concurrent.futures.ThreadPoolExecutor(
+    max_workers=int(os.environ.get('YTDL_WORKERS', 4)),
+    thread_name_prefix='ytdl'
+)
+
+# Immutable view of a job's progress fields. Writers mutate the job's
+# attributes and then rebind job.snapshot in a single assignment, which
+# is atomic under the GIL - readers grab the reference once and can
+# never see downloaded_bytes from a newer hook tick than total_bytes.
+ProgressSnapshot = namedtuple('ProgressSnapshot', [
+    'status', 'progress', 'filename', 'error',
+    'downloaded_bytes', 'total_bytes', 'speed', 'eta',
+    'downloaded_mb', 'total_mb', 'speed_mb', 'eta_formatted',
+])
+
+class DownloadProgress:
+    # Jobs are created per request and mutated from hook threads at high
+    # frequency; slots drop the per-instance __dict__ and make attribute
+    # access a fixed-offset read.
+    __slots__ = (
+        'status', 'progress', 'filename', 'error', 'temp_dir',
+        'ffmpeg_available', 'title', 'completed', 'downloaded_bytes',
+        'total_bytes', 'speed', 'eta', 'downloaded_mb', 'total_mb',
+        'speed_mb', 'eta_formatted', 'created_at', 'last_accessed',
+        'future', 'snapshot',
+    )
+
+    def __init__(self):
+        self.status = 'queued'
+        self.progress = 0.0
+        self.filename = ''
+        self.error = ''
+        self.temp_dir = ''
+        self.ffmpeg_available = False
+        self.title = ''
+        self.completed = False
+        self.downloaded_bytes = 0
+        self.total_bytes = 0
+        self.speed = 0
+        self.eta = 0
+        # Display values are precomputed on update so the polled status
+        # endpoint is a plain attribute read.
+        self.downloaded_mb = 0
+        self.total_mb = 0
+        self.speed_mb = 0
+        self.eta_formatted = '00:00'
+        self.created_at = datetime.now()  # Track creation time for cleanup
+        self.last_accessed = datetime.now()  # Track last access
+        self.future = None  # Future from DOWNLOAD_POOL for this job
+        self.publish()
+
+    def publish(self):
+        """Rebind .snapshot to a consistent copy of the progress fields.
+
+        Call after a group of related attribute writes; the rebind is a
+        single atomic assignment, so the status endpoint (which reads
+        only the snapshot) never observes a half-updated group.
+        """
+        self.snapshot = ProgressSnapshot(
+            self.status, self.progress, self.filename, self.error,
+            self.downloaded_bytes, self.total_bytes, self.speed, self.eta,
+            self.downloaded_mb, self.total_mb, self.speed_mb, self.eta_formatted,
+        )
+
+def format_duration(seconds):
+    try:
+        seconds = int(seconds)
+    except Exception:
+        return "Unknown"
+    if seconds <= 0:
+        return "00:00"
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours > 0:
+        return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+    else:
+        return f"{minutes:02d}:{seconds:02d}"
+
+def format_eta(eta_seconds):
+    """Format ETA seconds into mm:ss format"""
+    try:
+        eta_seconds = int(eta_seconds)
+        if eta_seconds <= 0:
+            return "00:00"
+        minutes = eta_seconds // 60
+        seconds = eta_seconds % 60
+        return f"{minutes:02d}:{seconds:02d}"
+    except Exception:
+        return "00:00"
+
+def bytes_to_mb(bytes_value):
+    """Convert bytes to megabytes with 2 decimal places"""
+    try:
+        return round(bytes_value / (1024 * 1024), 2)
+    except Exception:
+        return 0
+
+def format_file_size(bytes_value):
+    """Convert bytes to human readable format"""
+    try:
+        if bytes_value >= 1024 * 1024 * 1024:
+            return f"{round(bytes_value / (1024 * 1024 * 1024), 1)}GB"
+        elif bytes_value >= 1024 * 1024:
+            return f"{round(bytes_value / (1024 * 1024), 1)}MB"
+        elif bytes_value >= 1024:
+            return f"{round(bytes_value / 1024, 1)}KB"
+        else:
+            return f"{bytes_value}B"
+    except Exception:
+        return "Unknown"
+
+def _probe_ffmpeg():
+    """Return True if an ffmpeg binary is on PATH."""
+    return shutil.which('ffmpeg') is not None
+
+# ffmpeg availability cannot change mid-process, so probe once at import
+# instead of spawning a subprocess on every request.
+FFMPEG_AVAILABLE = _probe_ffmpeg()
+
+# Shared request headers for yt-dlp calls; the UA matches the android
+# player_client forced in the extractor args. Callers pass a copy since
+# yt-dlp may mutate its options dict.
+YTDL_HTTP_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Linux; Android 13; SM-G991B) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/112.0.0.0 Mobile Safari/537.36',
+    'Accept': '*/*',
+    'Accept-Language': 'en-US,en;q=0.9',
+    'Accept-Encoding': 'gzip, deflate, br',
+    'Connection': 'keep-alive',
+}
+
+# Content types for the two extensions the API can produce.
+_MIME_TYPES = {
+    'mp4': 'video/mp4',
+    'mp3': 'audio/mpeg',
+}
+_DEFAULT_MIME = 'application/octet-stream'
+
+def _attachment_disposition(filename):
+    """Build an attachment Content-Disposition safe for any title.
+
+    Response headers must be latin-1 encodable under WSGI, so non-ASCII
+    names go in the RFC 6266 filename* parameter (UTF-8, percent-encoded)
+    with an ASCII-mangled plain filename as the fallback - the same
+    shape send_file emits for its download_name.
+    """
+    try:
+        filename.encode('ascii')
+    except UnicodeEncodeError:
+        fallback = filename.encode('ascii', 'replace').decode('ascii').replace('"', "'")
+        return (
+            f'attachment; filename="{fallback}"; '
+            f"filename*=UTF-8''{quote(filename, safe='')}"
+        )
+    return f'attachment; filename="{filename.replace(chr(34), chr(39))}"'
+
+def safe_get_job(job_id):
+    """Thread-safe job retrieval with access tracking"""
+    with download_status_lock:
+        job = download_status.get(job_id)
+        if job:
+            job.last_accessed = datetime.now()
+        return job
+
+def safe_remove_job(job_id):
+    """Thread-safe job removal"""
+    with download_status_lock:
+        return download_status.pop(job_id, None)
+
+# Minimum interval between progress-field refreshes. yt-dlp can fire the
+# hook hundreds of times per second on fast links; the frontend polls ~1 Hz.
+HOOK_UPDATE_INTERVAL = 0.25
+
+def progress_hook_factory(job_id):
+    """Return a progress hook function bound to job_id."""
+    last_update = [0.0]
+
+    def hook(d):
+        status = d.get('status')
+
+        # Throttle 'downloading' ticks before taking any locks; terminal
+        # 'finished'/'error' events always pass through.
+        if status == 'downloading':
+            now = time.monotonic()
+            if now - last_update[0] < HOOK_UPDATE_INTERVAL:
+                return
+            last_update[0] = now
+
+        job = safe_get_job(job_id)
+        if job is None or job.completed:
+            return
+
+        if status == 'downloading':
+            job.status = 'downloading'
+
+            # Progress comes straight from the byte counters - parsing
+            # yt-dlp's formatted _percent_str back into a float was a
+            # string round-trip on every tick for the same numbers.
+            downloaded = d.get('downloaded_bytes', 0)
+            total = d.get('total_bytes') or d.get('total_bytes_estimate', 0)
+            speed = d.get('speed', 0)
+            eta = d.get('eta', 0)
+            if total:
+                job.progress = min(downloaded * 100.0 / total, 99.9)
+
+            job.downloaded_bytes = downloaded
+            job.total_bytes = total
+            job.speed = speed
+            job.eta = eta
+            job.downloaded_mb = bytes_to_mb(downloaded)
+            job.total_mb = bytes_to_mb(total)
+            job.speed_mb = bytes_to_mb(speed)
+            job.eta_formatted = format_eta(eta)
+            job.publish()
+
+        elif status == 'finished':
+            if not job.completed:
+                job.progress = 99.9
+                job.downloaded_bytes = job.total_bytes
+                job.speed = 0
+                job.eta = 0
+                job.downloaded_mb = job.total_mb
+                job.speed_mb = 0
+                job.eta_formatted = '00:00'
+            if 'filename' in d:
+                try:
+                    job.filename = os.path.abspath(d['filename'])
+                except Exception:
+                    job.filename = d['filename']
+            job.publish()
+            logger.info("Progress hook finished for job %s: %s", job_id, d.get('filename', ''))
+        elif status == 'error':
+            if not job.completed:
+                job.status = 'error'
+                job.error = d.get('error', 'Unknown error reported by yt-dlp')
+                job.publish()
+                logger.error("Progress hook error for job %s: %s", job_id, job.error)
+    return hook
+
+def find_final_file_in_dir(temp_dir, title_hint=None):
+    """Return the best candidate file path inside temp_dir.
+
+    Uses os.scandir so each entry's type and size come from a single
+    syscall instead of the listdir + isfile + getsize triple-stat.
+    """
+    if not temp_dir or not os.path.isdir(temp_dir):
+        return None
+
+    normalized = None
+    if title_hint:
+        normalized = title_hint.replace('/', '_').replace('\\', '_').strip()
+
+    # One directory walk, one stat per entry: collect title-prefix matches
+    # and the full candidate list in the same pass, preferring matches but
+    # falling back to the largest file when yt-dlp renamed the output.
+    entries = []
+    matches = []
+    try:
+        with os.scandir(temp_dir) as it:
+            for entry in it:
+                if not entry.is_file(follow_symlinks=False) or entry.name.endswith('.part'):
+                    continue
+                candidate = (entry.path, entry.stat().st_size)
+                entries.append(candidate)
+                if normalized and entry.name.startswith(normalized):
+                    matches.append(candidate)
+    except Exception as e:
+        logger.error("Error listing temp_dir %s: %s", temp_dir, e)
+        return None
+
+    best = matches or entries
+    if not best:
+        return None
+    return max(best, key=lambda e: e[1])[0]
+
+# Allowed yt-dlp selector syntax: alphanumerics plus []+/._-!=*?, with a
+# 100-char cap; '..' and '//' stay rejected via the lookahead. One
+# C-level regex scan replaces the old per-character set-membership loop.
+_FORMAT_STRING_RE = re.compile(r'\A(?!.*(?:\.\.|//))[A-Za-z0-9\[\]+/._\-!=*?,]{1,100}\Z')
+
+def validate_format_string(format_str):
+    if not isinstance(format_str, str):
+        return False
+    return _FORMAT_STRING_RE.match(format_str.strip()) is not None
+
+
+_tls = threading.local()
+
+def _get_metadata_ydl():
+    """Return this thread's shared metadata-only YoutubeDL instance.
+
+    Constructing YoutubeDL loads the extractor registry and parses the
+    cookie file, so reuse one instance per thread for
+    extract_info(download=False) calls whose options never vary. Download
+    workers still build their own instance because outtmpl and progress
+    hooks are baked in at construction time.
+    """
+    ydl = getattr(_tls, 'metadata_ydl', None)
+    if ydl is None:
+        ydl_opts = {
+            'quiet': True,
+            'no_warnings': True,
+            'skip_download': True,
+            'socket_timeout': 30,
+            'extract_flat': False,
+            'ignoreerrors': False,
+            'no_color': True,
+            'http_headers': dict(YTDL_HTTP_HEADERS),
+        }
+        if YTDL_COOKIES_PATH and os.path.exists(YTDL_COOKIES_PATH):
+            cleaned_cookies = clean_cookies_file(YTDL_COOKIES_PATH)
+            ydl_opts['cookiefile'] = cleaned_cookies if cleaned_cookies else YTDL_COOKIES_PATH
+        ydl = yt_dlp.YoutubeDL(ydl_opts)
+        _tls.metadata_ydl = ydl
+    return ydl
+
+# The cookies file only changes when an operator uploads a new one, yet
+# it used to be re-read and rewritten to a fresh uniquely named /tmp
+# file on every yt-dlp invocation, leaking one file per call. Cache the
+# cleaned copy at a stable path keyed by the source's (mtime_ns, size)
+# and regenerate only when the source rotates.
+_cleaned_cookies_lock = threading.Lock()
+_cleaned_cookies_key = None
+_cleaned_cookies_path = os.path.join(tempfile.gettempdir(), 'ytdl_cookies_cleaned.txt')
+
+def _remove_cleaned_cookies():
+    try:
+        os.unlink(_cleaned_cookies_path)
+    except OSError:
+        pass
+
+# The cleaned copy holds session cookies; don't leave it behind after
+# the process exits.
+atexit.register(_remove_cleaned_cookies)
+
+def clean_cookies_file(cookies_path):
+    """Clean and fix cookies file to ensure Netscape format compatibility"""
+    global _cleaned_cookies_key
+    try:
+        st = os.stat(cookies_path)
+    except OSError:
+        return None
+
+    key = (st.st_mtime_ns, st.st_size)
+    with _cleaned_cookies_lock:
+        if key == _cleaned_cookies_key and os.path.exists(_cleaned_cookies_path):
+            return _cleaned_cookies_path
+        return _rebuild_cleaned_cookies(cookies_path, key)
+
+def _rebuild_cleaned_cookies(cookies_path, key):
+    """Regenerate the cleaned cookies copy; caller holds the cache lock."""
+    global _cleaned_cookies_key
+    try:
+        # Single streaming pass in binary: keep only the first Netscape
+        # header, drop other comments and blank lines, copy cookie lines
+        # through untouched. No line list is materialized.
+        # Write-then-rename so concurrent yt-dlp readers never see a
+        # half-written file.
+        tmp_path = f'{_cleaned_cookies_path}.{uuid.uuid4().hex}.tmp'
+        seen_header = False
+        with open(cookies_path, 'rb') as src, open(tmp_path, 'wb') as dst:
+            for line in src:
+                if line.lstrip().startswith(b'#'):
+                    if b'Netscape HTTP Cookie File' in line and not seen_header:
+                        dst.write(b'# Netscape HTTP Cookie File\n')
+                        seen_header = True
+                    # Other comments (e.g. the curl.haxx.se line) dropped
+                    continue
+                if line.strip():
+                    dst.write(line)
+        os.replace(tmp_path, _cleaned_cookies_path)
+
+        _cleaned_cookies_key = key
+        logger.info("Refreshed cleaned cookies file: %s", _cleaned_cookies_path)
+        return _cleaned_cookies_path
+
+    except Exception as e:
+        logger.error("Error cleaning cookies file: %s", e)
+        # If cleaning fails, try to use original
+        return cookies_path
+
+def get_ytdlp_opts_with_retry(temp_dir, job_id, format_str, file_ext, ffmpeg_available):
+    """Get yt-dlp options optimized for Render.com to avoid SABR and signature issues"""
+    
+    # Base options optimized for stability
+    base_opts = {
+        'outtmpl': os.path.join(temp_dir, '%(title)s.%(ext)s'),
+        'progress_hooks': [progress_hook_factory(job_id)],
+        'restrictfilenames': False,
+        'quiet': False,
+        'no_warnings': False,
+        'nopart': False,
+        'noplaylist': True,
+        'extractor_retries': 3,
+        'retries': 10,
+        'fragment_retries': 10,
+        'skip_unavailable_fragments': True,
+        'continuedl': True,
+        # DASH/HLS videos are thousands of small fragments; fetching them
+        # in parallel with ranged GETs gives near-linear speedup on fast
+        # links.
+        'concurrent_fragment_downloads': int(os.environ.get('YTDL_FRAG_CONCURRENCY', 8)),
+        'http_chunk_size': 10_485_760,
+        'age_limit': None,
+        'playlist_items': '1',
+        'allow_unplayable_formats': False,
+        'ignore_no_formats_error': True,  # Changed to True to ignore format errors
+        'format_sort': ['res', 'ext:mp4:m4a'],
+        'merge_output_format': 'mp4',
+        
+        # CRITICAL: Force Android client only to avoid SABR streaming
+        'extractor_args': {
+            'youtube': {
+                'player_client': ['android'],  # Only android, no web/safari
+                'player_skip': ['js', 'configs', 'webpage'],
+            }
+        },
+        
+        # Enhanced format selection with safe fallbacks
+        'format': 'bv*[vcodec^=avc1]+ba[acodec^=mp4a] / bv*+ba/best[height<=1080] / best',
+        
+        # HTTP settings optimized for Render
+        'http_headers': dict(YTDL_HTTP_HEADERS),
+        
+        # Anti-bot measures
+        'sleep_interval': 2,
+        'max_sleep_interval': 8,
+        'throttled_rate': '512K',
+        
+        # Error handling
+        'ignoreerrors': True,  # Continue on minor errors
+        'no_check_certificate': True,
+        'prefer_insecure': False,
+    }
+
+    # Cookies handling - simplified for Render
+    cookies_loaded = False
+    if YTDL_COOKIES_PATH and os.path.exists(YTDL_COOKIES_PATH):
+        try:
+            cleaned_cookies = clean_cookies_file(YTDL_COOKIES_PATH)
+            if cleaned_cookies:
+                base_opts['cookiefile'] = cleaned_cookies
+                logger.info("✅ Using cleaned cookies file: %s for job %s", cleaned_cookies, job_id)
+                cookies_loaded = True
+        except Exception as e:
+            logger.error("Failed to set cookiefile: %s", e)
+    
+    # REMOVED cookiesfrombrowser completely - Render doesn't have Chrome
+    
+    # Format-specific configuration
+    try:
+        if file_ext == 'mp3':
+            if ffmpeg_available:
+                base_opts.update({
+                    'format': 'bestaudio/best',
+                    'postprocessors': [{
+                        'key': 'FFmpegExtractAudio',
+                        'preferredcodec': 'mp3',
+                        'preferredquality': '192',
+                    }],
+                })
+            else:
+                base_opts['format'] = 'bestaudio[ext=m4a]'  # remove the fallback slash
+        else:
+            if format_str and validate_format_string(format_str):
+                format_with_fallback = f"{format_str}/bv*[height<=1080]+ba/b[height<=720]/best[height<=1080]/best"
+                base_opts['format'] = format_with_fallback
+                logger.info("Job %s - using enhanced format with fallback: %s", job_id, format_with_fallback)
+            else:
+                base_opts['format'] = 'bv*[vcodec^=avc1][height<=1080]+ba[acodec^=mp4a] / bv*[height<=1080]+ba / best[height<=1080] / best'
+                logger.info("Job %s - using default android-optimized format", job_id)
+
+    except Exception as e:
+        logger.exception("Job %s - error building format options: %s", job_id, e)
+        # Ultimate fallback - let yt-dlp choose the best available
+        base_opts['format'] = 'best'
+        base_opts['ignoreerrors'] = True
+
+    return base_opts
+
+def get_fallback_ydl_opts(temp_dir, job_id):
+    """Ultimate fallback options when everything else fails"""
+    return {
+        'outtmpl': os.path.join(temp_dir, '%(title)s.%(ext)s'),
+        'format': 'best',
+        'ignoreerrors': True,
+        'no_warnings': False,
+        'extractor_args': {
+            'youtube': {
+                'player_client': ['android'],
+            }
+        },
+        'http_headers': {
+            'User-Agent': 'Mozilla/5.0 (Linux; Android 13) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/112.0.0.0 Mobile Safari/537.36',
+        },
+    }
+
+def handle_download_error(job, job_id, error, retry_count, max_retries):
+    """Handle download errors with appropriate retry logic"""
+    error_msg = str(error)
+    logger.warning("Job %s - DownloadError (attempt %d/%d): %s", job_id, retry_count + 1, max_retries, error_msg)
+    
+    if "sign in to confirm" in error_msg.lower() or "confirm you're not a bot" in error_msg.lower():
+        job.status = 'error'
+        job.error = '🤖 Bot detection triggered. Please ensure cookies.txt is uploaded and YTDL_COOKIES_PATH is configured correctly.'
+        job.completed = True
+        job.publish()
+        logger.error("❌ Bot detection error - cookies may be missing or invalid")
+        return False
+    
+    non_retryable_errors = [
+        "requested format is not available",
+        "private video", 
+        "video unavailable",
+        "this video is not available",
+        "no video formats found",
+        "this video is private"
+    ]
+    
+    for msg in non_retryable_errors:
+        if msg in error_msg.lower():
+            job.status = 'error'
+            if "requested format is not available" in error_msg.lower():
+                job.error = 'The requested quality is not available for this video. Please try a lower quality.'
+            elif "private video" in error_msg.lower():
+                job.error = 'This video is private and cannot be downloaded.'
+            elif "video unavailable" in error_msg.lower():
+                job.error = 'This video is unavailable.'
+            else:
+                job.error = f'Download failed: {error_msg}'
+            job.completed = True
+            job.publish()
+            return False
+    
+    retryable_errors = [
+        "http error 403",
+        "http error 429", 
+        "forbidden",
+        "too many requests",
+        "age restricted",
+        "rate limit"
+    ]
+    
+    for msg in retryable_errors:
+        if msg in error_msg.lower():
+            if retry_count < max_retries - 1:  # Fixed: don't double increment
+                wait_time = min(2 ** (retry_count + 1), 30)
+                logger.info("Job %s - %s error, waiting %d seconds before retry %d", 
+                           job_id, msg.upper(), wait_time, retry_count + 2)
+                time.sleep(wait_time)
+                return True
+            else:
+                job.status = 'error'
+                job.error = 'YouTube is blocking downloads. Please ensure cookies are properly configured.'
+                job.completed = True
+                job.publish()
+                return False
+    
+    job.status = 'error'
+    job.error = f'Download failed: {error_msg}'
+    job.completed = True
+    job.publish()
+    return False
+
+def download_worker(url, format_str, file_ext, job_id):
+    try:
+        job = safe_get_job(job_id)
+        if job is None:
+            logger.error("Download worker called with missing job_id: %s", job_id)
+            return
+
+        temp_dir = tempfile.mkdtemp(prefix=f'ytdl_{uuid.uuid4().hex}_', dir=TMP_ROOT)
+        job.temp_dir = temp_dir
+        job.ffmpeg_available = FFMPEG_AVAILABLE
+        logger.info("Job %s - temp_dir: %s - ffmpeg_available: %s", job_id, temp_dir, job.ffmpeg_available)
+
+        job.status = 'downloading'
+        job.progress = 0.0
+        job.downloaded_bytes = 0
+        job.total_bytes = 0
+        job.speed = 0
+        job.eta = 0
+        job.publish()
+
+        max_retries = 3
+        retry_count = 0
+    
+        while retry_count < max_retries:
+            try:
+                ydl_opts = get_ytdlp_opts_with_retry(temp_dir, job_id, format_str, file_ext, job.ffmpeg_available)
+            
+                with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+                    info = ydl.extract_info(url, download=True)
+                    title = info.get('title') if isinstance(info, dict) else None
+                    if title:
+                        job.title = title
+
+                    # Gather the paths yt-dlp reported and verify each with
+                    # a single stat; its st_size doubles as the final size.
+                    candidates = []
+                    if job.filename:
+                        candidates.append(job.filename)
+                    if isinstance(info, dict):
+                        try:
+                            candidates.append(ydl.prepare_filename(info))
+                        except Exception:
+                            pass
+                        req = info.get('requested_downloads')
+                        if req and isinstance(req, list):
+                            for r in req:
+                                p = r.get('filepath') or r.get('path')
+                                if p:
+                                    candidates.append(p)
+
+                    final = None
+                    final_size = 0
+                    for candidate in candidates:
+                        try:
+                            final_size = os.stat(candidate).st_size
+                        except OSError:
+                            continue
+                        final = candidate
+                        break
+
+                    # Directory scan is the cold path: only reached when neither
+                    # the progress hook nor yt-dlp's own metadata named the file.
+                    if not final:
+                        candidate = find_final_file_in_dir(temp_dir, title_hint=job.title)
+                        if candidate:
+                            final = candidate
+                            try:
+                                final_size = os.stat(final).st_size
+                            except OSError:
+                                final_size = 0
+
+                    if final:
+                        final = os.path.abspath(final)
+                        job.filename = final
+                        job.status = 'completed'
+                        job.progress = 100.0
+                        job.completed = True
+
+                        job.downloaded_bytes = final_size
+                        job.total_bytes = final_size
+                        job.downloaded_mb = job.total_mb = bytes_to_mb(final_size)
+
+                        # More reasonable minimum file size check
+                        if final_size < 1024:  # 1KB minimum
+                            job.status = 'error'
+                            job.error = 'Downloaded file is too small or corrupted'
+                            logger.error("Job %s - file too small: %s (%d bytes)", job_id, final, final_size)
+
+                        job.publish()
+                        logger.info("✅ Job %s - download completed: %s", job_id, final)
+                        break
+                    else:
+                        job.status = 'error'
+                        job.error = 'Could not determine final output filename'
+                        job.completed = True
+                        job.publish()
+                        logger.error("Job %s - final file not found in %s", job_id, temp_dir)
+                        break
+
+            except yt_dlp.utils.DownloadError as e:
+                should_retry = handle_download_error(job, job_id, e, retry_count, max_retries)
+                if should_retry:
+                    retry_count += 1
+                    continue
+                else:
+                    break
+
+            except Exception as e:
+                logger.exception("Job %s - unexpected exception (attempt %d/%d): %s", job_id, retry_count + 1, max_retries, e)
+                retry_count += 1
+                if retry_count < max_retries:
+                    time.sleep(2)
+                    continue
+                else:
+                    job.status = 'error'
+                    job.error = f'Unexpected error: {str(e)}'
+                    job.completed = True
+                    job.publish()
+                    break
+
+        if job.status == 'error' and job.temp_dir:
+            try:
+                shutil.rmtree(job.temp_dir)
+                logger.info("Cleaned up temp directory for failed job %s", job_id)
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                logger.error("Error cleaning up temp dir for job %s: %s", job_id, e)
+    finally:
+        with download_status_lock:
+            key = (url, format_str, file_ext)
+            if _inflight_downloads.get(key) == job_id:
+                del _inflight_downloads[key]
+
+
+# The old per-call pattern list collapsed into one alternation compiled
+# at import: watch URLs with v= anywhere in the query, youtu.be short
+# links, and embed paths.
+_VIDEO_ID_RE = re.compile(
+    r'(?:youtube\.com/watch\?(?:.*?&)?v=|youtu\.be/|youtube\.com/embed/)([a-zA-Z0-9_-]{11})'
+)
+
+def extract_video_id(url):
+    """Extract YouTube video ID from various URL formats"""
+    match = _VIDEO_ID_RE.search(url)
+    return match.group(1) if match else None
+
+def cleanup_old_jobs():
+    """Remove old jobs and their temp directories"""
+    try:
+        now = datetime.now()
+
+        # Hold the lock only for the O(N) pointer-copy snapshot; the
+        # per-job datetime arithmetic runs outside it so request handlers
+        # aren't blocked for the duration of the scan.
+        with download_status_lock:
+            snapshot = list(download_status.items())
+
+        expired_jobs = [
+            (job_id, job) for job_id, job in snapshot
+            # Remove jobs past max age, or completed jobs idle too long
+            if (now - job.created_at).total_seconds() > JOB_MAX_AGE or
+               (job.completed and (now - job.last_accessed).total_seconds() > JOB_IDLE_EXPIRY)
+        ]
+        
+        for job_id, job in expired_jobs:
+            if job.temp_dir:
+                # rmtree does its own existence check; a pre-flight
+                # os.path.exists would just be an extra stat per job.
+                try:
+                    shutil.rmtree(job.temp_dir)
+                    logger.info("Cleanup removed temp_dir %s for expired job %s", job.temp_dir, job_id)
+                except FileNotFoundError:
+                    pass
+                except Exception as e:
+                    logger.error("Error removing temp dir %s: %s", job.temp_dir, e)
+            safe_remove_job(job_id)
+            
+        if expired_jobs:
+            logger.info("Cleaned up %d expired jobs", len(expired_jobs))
+            
+    except Exception as e:
+        logger.error("Error in cleanup_old_jobs: %s", e)
+
+def sweep_orphaned_temp_dirs():
+    """Remove ytdl_* staging dirs in TMP_ROOT no live job knows about.
+
+    A crash or redeploy mid-download leaves the directory behind with no
+    download_status entry, so the job sweep never reclaims it. Anything
+    older than ORPHAN_DIR_MAX_AGE and not referenced by a current job is
+    fair game.
+    """
+    cutoff = time.time() - ORPHAN_DIR_MAX_AGE
+    with download_status_lock:
+        live_dirs = {job.temp_dir for job in download_status.values() if job.temp_dir}
+    try:
+        with os.scandir(TMP_ROOT) as it:
+            for entry in it:
+                if not entry.name.startswith('ytdl_'):
+                    continue
+                try:
+                    if not entry.is_dir(follow_symlinks=False):
+                        continue
+                    if entry.path in live_dirs or entry.stat().st_mtime > cutoff:
+                        continue
+                    shutil.rmtree(entry.path)
+                    logger.info("Removed orphaned temp dir %s", entry.path)
+                except FileNotFoundError:
+                    pass
+                except Exception as e:
+                    logger.error("Error removing orphaned temp dir %s: %s", entry.path, e)
+    except Exception as e:
+        logger.error("Error sweeping %s for orphaned dirs: %s", TMP_ROOT, e)
+
+# Deferred cleanup runs on one long-lived scheduler thread popping due
+# work from a min-heap, instead of a sleeping thread per served download
+# plus a threading.Timer chain for the periodic sweep. Heap entries are
+# (deadline, seq, job_id); job_id None marks the periodic sweep and the
+# seq counter keeps tuples comparable when deadlines collide.
+JOB_CLEANUP_DELAY = 300
+PERIODIC_CLEANUP_INTERVAL = 1800
+
+# Expiry thresholds for the periodic sweep.
+JOB_MAX_AGE = 3600
+JOB_IDLE_EXPIRY = 1800
+ORPHAN_DIR_MAX_AGE = 24 * 3600
+
+_cleanup_heap = []
+_cleanup_cv = threading.Condition()
+_cleanup_seq = itertools.count()
+
+def request_job_cleanup(job_id, delay=JOB_CLEANUP_DELAY):
+    """Schedule removal of a job and its temp dir after delay seconds."""
+    with _cleanup_cv:
+        heapq.heappush(_cleanup_heap, (time.monotonic() + delay, next(_cleanup_seq), job_id))
+        _cleanup_cv.notify()
+
+def _remove_job_and_temp_dir(job_id):
+    job = safe_get_job(job_id)
+    if job and job.temp_dir:
+        try:
+            shutil.rmtree(job.temp_dir)
+            logger.info("Scheduled cleanup removed %s for job %s", job.temp_dir, job_id)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.error("Error removing temp dir %s: %s", job.temp_dir, e)
+    safe_remove_job(job_id)
+
+def _cleanup_scheduler():
+    while True:
+        with _cleanup_cv:
+            while not _cleanup_heap:
+                _cleanup_cv.wait()
+            deadline, _, job_id = _cleanup_heap[0]
+            remaining = deadline - time.monotonic()
+            if remaining > 0:
+                # A new, earlier entry wakes us via notify; re-check then.
+                _cleanup_cv.wait(timeout=remaining)
+                continue
+            heapq.heappop(_cleanup_heap)
+        try:
+            if job_id is None:
+                cleanup_old_jobs()
+                sweep_orphaned_temp_dirs()
+                request_job_cleanup(None, delay=PERIODIC_CLEANUP_INTERVAL)
+            else:
+                _remove_job_and_temp_dir(job_id)
+        except Exception as e:
+            logger.error("Cleanup scheduler error: %s", e)
+
+# Seed the periodic sweep and start the scheduler at import so it also
+# runs under gunicorn, where __main__ never executes.
+request_job_cleanup(None, delay=PERIODIC_CLEANUP_INTERVAL)
+threading.Thread(target=_cleanup_scheduler, name='cleanup', daemon=True).start()
+
+@app.route('/api/ffmpeg-status')
+def get_ffmpeg_status():
+    return jsonify({'ffmpeg_available': FFMPEG_AVAILABLE})
+
+class TimeoutException(Exception):
+    pass
+
+# Shared pool for timed-out info extraction. A pool thread survives the
+# timeout and finishes (or fails) in the background instead of leaking a
+# fresh daemon thread per request, and because pool threads are reused,
+# each one pays the _get_metadata_ydl construction cost once and serves
+# every later extraction from its warm instance.
+_VIDEO_INFO_EXECUTOR = concurrent.futures.ThreadPoolExecutor(
+    max_workers=int(os.environ.get('YTDL_INFO_WORKERS', 8)),
+    thread_name_prefix='ytinfo'
+)
+
+def _extract_info_job(url):
+    return _get_metadata_ydl().extract_info(url, download=False)
+
+def extract_video_info_with_timeout(url, timeout_seconds=30):
+    """Extract video info with a timeout via the shared info executor."""
+    future = _VIDEO_INFO_EXECUTOR.submit(_extract_info_job, url)
+    try:
+        return future.result(timeout=timeout_seconds)
+    except concurrent.futures.TimeoutError:
+        raise TimeoutException(f"Video info extraction timed out after {timeout_seconds} seconds")
+
+# Cache the JSON-able /api/video-info projection per URL so repeat hits
+# (e.g. the same frontend loading the page twice) skip the multi-second
+# yt-dlp extraction.
+VIDEO_INFO_CACHE_TTL = 300
+VIDEO_INFO_CACHE_MAX = 512
+
+# Cap on format entries returned by /api/video-info after dedup.
+MAX_VIDEO_INFO_FORMATS = 10
+_video_info_cache = {}
+_video_info_cache_lock = threading.Lock()
+
+def _video_info_cache_get(url):
+    """Return a copy of the cached projection for url, or None."""
+    now = time.monotonic()
+    with _video_info_cache_lock:
+        entry = _video_info_cache.get(url)
+        if entry is None:
+            return None
+        expires, payload = entry
+        if expires < now:
+            del _video_info_cache[url]
+            return None
+        return copy.deepcopy(payload)
+
+def _video_info_cache_put(url, payload):
+    """Store a copy of the projection for url, evicting stale entries."""
+    now = time.monotonic()
+    with _video_info_cache_lock:
+        if len(_video_info_cache) >= VIDEO_INFO_CACHE_MAX:
+            expired = [k for k, (exp, _) in _video_info_cache.items() if exp < now]
+            for k in expired:
+                del _video_info_cache[k]
+            while len(_video_info_cache) >= VIDEO_INFO_CACHE_MAX:
+                _video_info_cache.pop(next(iter(_video_info_cache)))
+        _video_info_cache[url] = (now + VIDEO_INFO_CACHE_TTL, copy.deepcopy(payload))
+
+def _build_format(f):
+    """Project one yt-dlp format dict into the /api/video-info shape."""
+    get = f.get
+    filesize = get('filesize') or get('filesize_approx')
+    vcodec = get('vcodec', 'none')
+    acodec = get('acodec', 'none')
+    height = get('height')
+    format_note = get('format_note', '')
+
+    if height:
+        resolution = f"{height}p"
+    else:
+        resolution = format_note or None
+
+    abr = get('abr')
+    if abr:
+        quality = f"{abr}kbps"
+    else:
+        quality = resolution or 'Best Quality'
+
+    return {
+        'format_id': get('format_id'),
+        'ext': get('ext', ''),
+        'resolution': resolution,
+        'quality': quality,
+        'filesize': format_file_size(filesize) if filesize else None,
+        'filesize_bytes': filesize,
+        'vcodec': vcodec,
+        'acodec': acodec,
+        'format_note': format_note,
+        'fps': get('fps'),
+        'type': 'audio' if acodec != 'none' and vcodec == 'none' else 'video',
+    }
+
+@app.route('/api/video-info', methods=['POST'])
+def get_video_info():
+    data = request.get_json() or {}
+    url = data.get('url')
+    if not url:
+        return jsonify({'error': 'URL is required'}), 400
+
+    # Basic URL validation
+    if not url.startswith(('http://', 'https://')):
+        return jsonify({'error': 'Invalid URL format'}), 400
+
+    cached = _video_info_cache_get(url)
+    if cached is not None:
+        return jsonify(cached)
+
+    try:
+        # Options (including the cookiefile) live on the per-thread
+        # metadata instance built by _get_metadata_ydl.
+        try:
+            info = extract_video_info_with_timeout(url, timeout_seconds=25)
+        except TimeoutException:
+            logger.error("Video info extraction timed out for URL: %s", url)
+            return jsonify({
+                'error': 'YouTube is taking too long to respond. This video may be heavily restricted. Please try a different video.',
+                'suggestion': 'Try using a video that is publicly available and not age-restricted'
+            }), 408  # 408 Request Timeout
+        
+        # Deduplicate server-side: the client only needs the best variant
+        # per resolution (plus the best audio-only stream), not all 30-50
+        # entries yt-dlp reports. Keep the highest-bitrate format per
+        # bucket and cap the payload.
+        best_by_bucket = {}
+        for f in info.get('formats', []) if isinstance(info, dict) else []:
+            if not f.get('format_id'):
+                continue
+            vcodec = f.get('vcodec', 'none')
+            acodec = f.get('acodec', 'none')
+            if vcodec == 'none' and acodec == 'none':
+                continue
+            is_audio = acodec != 'none' and vcodec == 'none'
+            bucket = 'audio' if is_audio else f.get('height')
+            prev = best_by_bucket.get(bucket)
+            if prev is None or (f.get('tbr') or 0) > (prev.get('tbr') or 0):
+                best_by_bucket[bucket] = f
+
+        selected = sorted(
+            best_by_bucket.values(),
+            key=lambda f: f.get('height') or 0,
+            reverse=True
+        )[:MAX_VIDEO_INFO_FORMATS]
+
+        formats = [_build_format(f) for f in selected]
+
+        # Escape HTML characters in title to prevent XSS. html.escape is
+        # one C-level pass; the single replace keeps the &#039; apostrophe
+        # form existing clients expect instead of html.escape's &#x27;.
+        title = html.escape(str(info.get('title') or 'Unknown'), quote=True).replace('&#x27;', '&#039;')
+        
+        video_info = {
+            'title': title,
+            'duration': format_duration(info.get('duration', 0)),
+            'thumbnail': info.get('thumbnail', ''),
+            'channel': info.get('uploader', 'Unknown'),
+            'view_count': info.get('view_count', 0),
+            'formats': formats
+        }
+        
+        # Check if we have any downloadable formats
+        downloadable_formats = [f for f in formats if f.get('vcodec') != 'none' or f.get('acodec') != 'none']
+        if not downloadable_formats:
+            video_info['warning'] = 'No downloadable formats available. This video may be restricted.'
+
+        _video_info_cache_put(url, video_info)
+
+        return jsonify(video_info)
+        
+    except yt_dlp.utils.DownloadError as e:
+        error_msg = str(e)
+        logger.error("DownloadError fetching video info: %s", error_msg)
+        
+        # Handle specific YouTube restrictions
+        if "signature extraction failed" in error_msg.lower():
+            return jsonify({
+                'error': 'YouTube signature extraction failed. This video is heavily restricted.',
+                'suggestion': 'Try using a different video or ensure your cookies are properly configured'
+            }), 423  # 423 Locked
+        
+        elif "requested format is not available" in error_msg.lower():
+            return jsonify({
+                'error': 'No downloadable formats available for this video.',
+                'suggestion': 'This video may be age-restricted, region-locked, or otherwise restricted by YouTube'
+            }), 404
+        
+        elif "video unavailable" in error_msg.lower():
+            return jsonify({
+                'error': 'This video is unavailable.',
+                'suggestion': 'The video may have been removed or made private'
+            }), 404
+        
+        else:
+            return jsonify({
+                'error': 'YouTube is restricting access to this video.',
+                'details': 'Please try a different video or check if the video is publicly available'
+            }), 403
+        
+    except Exception as e:
+        error_msg = str(e)
+        logger.exception("Unexpected error fetching video info: %s", error_msg)
+        return jsonify({
+            'error': 'Failed to fetch video information.',
+            'suggestion': 'Please try again with a different video URL'
+        }), 500
+
+@app.route('/api/download', methods=['POST'])
+def download_video():
+    """Download endpoint without CAPTCHA verification"""
+    data = request.get_json() or {}
+    url = data.get('url')
+    format_str = data.get('format')
+    file_ext = data.get('file_ext', 'mp4')
+
+    if not url or not format_str:
+        return jsonify({'error': 'URL and format are required'}), 400
+    
+    # Basic URL validation
+    if not url.startswith(('http://', 'https://')):
+        return jsonify({'error': 'Invalid URL format'}), 400
+    
+    if not validate_format_string(format_str):
+        logger.warning("Invalid format string rejected: %s", format_str)
+        return jsonify({'error': 'Invalid format specification'}), 400
+    
+    allowed_extensions = ['mp4', 'mp3']
+    if file_ext not in allowed_extensions:
+        return jsonify({'error': f'Invalid file extension. Allowed: {", ".join(allowed_extensions)}'}), 400
+
+    inflight_key = (url, format_str, file_ext)
+    job_id = secrets.token_urlsafe(16)
+    job = DownloadProgress()
+    job.ffmpeg_available = FFMPEG_AVAILABLE
+    # Check and reserve under one lock acquisition: with separate ones,
+    # two identical requests could both miss the check and start
+    # duplicate downloads.
+    with download_status_lock:
+        existing_id = _inflight_downloads.get(inflight_key)
+        if existing_id:
+            existing = download_status.get(existing_id)
+            if existing and not existing.completed:
+                # Same video/format already downloading - attach to it
+                # instead of duplicating the network and disk work.
+                logger.info("Coalescing duplicate download of %s onto job %s", url, existing_id)
+                return jsonify({'job_id': existing_id, 'ffmpeg_available': existing.ffmpeg_available})
+            del _inflight_downloads[inflight_key]
+        download_status[job_id] = job
+        _inflight_downloads[inflight_key] = job_id
+
+    logger.info("Processing download for URL %s with job %s", url, job_id)
+
+    job.future = DOWNLOAD_POOL.submit(download_worker, url, format_str, file_ext, job_id)
+
+    return jsonify({'job_id': job_id, 'ffmpeg_available': job.ffmpeg_available})
+
+STREAM_CHUNK_SIZE = 1024 * 1024  # 1 MiB
+
+# Streams bypass DOWNLOAD_POOL (each is a subprocess, not a worker
+# thread), so cap them separately; released when the generator closes.
+_stream_slots = threading.BoundedSemaphore(int(os.environ.get('YTDL_STREAM_CONCURRENCY', 4)))
+
+@app.route('/api/stream', methods=['POST'])
+def stream_video():
+    """Stream a download straight to the client without staging it on disk.
+
+    Runs yt-dlp as a subprocess writing to stdout and relays chunks as
+    they arrive, so the first byte reaches the client while the download
+    is still in progress. Formats that need ffmpeg muxing should use the
+    regular /api/download job flow instead.
+    """
+    data = request.get_json() or {}
+    url = data.get('url')
+    format_str = data.get('format') or 'best'
+    file_ext = data.get('file_ext', 'mp4')
+
+    if not url:
+        return jsonify({'error': 'URL is required'}), 400
+
+    if not url.startswith(('http://', 'https://')):
+        return jsonify({'error': 'Invalid URL format'}), 400
+
+    if not validate_format_string(format_str):
+        logger.warning("Invalid format string rejected for stream: %s", format_str)
+        return jsonify({'error': 'Invalid format specification'}), 400
+
+    # mp3 needs the ffmpeg extract-audio step, which can't run on a
+    # stdout pipe — the raw stream would be a video container mislabelled
+    # as audio/mpeg. Audio downloads go through the /api/download job flow.
+    if file_ext != 'mp4':
+        return jsonify({'error': 'Only mp4 can be streamed; use /api/download for mp3'}), 400
+
+    if not _stream_slots.acquire(blocking=False):
+        return jsonify({'error': 'Too many concurrent streams, try again shortly'}), 503
+
+    cmd = [
+        sys.executable, '-m', 'yt_dlp',
+        '--quiet', '--no-warnings', '--no-playlist',
+        '-f', format_str,
+        '-o', '-',
+        url,
+    ]
+    if YTDL_COOKIES_PATH and os.path.exists(YTDL_COOKIES_PATH):
+        cleaned_cookies = clean_cookies_file(YTDL_COOKIES_PATH)
+        cmd[-1:-1] = ['--cookies', cleaned_cookies if cleaned_cookies else YTDL_COOKIES_PATH]
+
+    try:
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    except Exception as e:
+        _stream_slots.release()
+        logger.error("Error starting stream subprocess: %s", e)
+        return jsonify({'error': 'Failed to start stream'}), 500
+
+    def generate():
+        try:
+            while True:
+                chunk = proc.stdout.read(STREAM_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            try:
+                proc.stdout.close()
+                proc.terminate()
+                proc.wait(timeout=10)
+            except Exception as e:
+                logger.error("Error tearing down stream subprocess: %s", e)
+            _stream_slots.release()
+
+    headers = {'Content-Disposition': f'attachment; filename="download.{file_ext}"'}
+    return Response(stream_with_context(generate()), mimetype='video/mp4', headers=headers)
+
+@app.route('/api/download-status/<job_id>')
+def get_download_status(job_id):
+    job = safe_get_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Download job not found'}), 404
+
+    # Read the immutable snapshot once; writers rebind it atomically, so
+    # every field below comes from the same update.
+    snap = job.snapshot
+
+    # status + byte counters only move forward, so they make a cheap
+    # ETag; pollers of an idle or slow job get a bodyless 304 instead of
+    # a freshly serialized payload every second.
+    etag = f'"{snap.status}-{snap.downloaded_bytes}-{snap.total_bytes}"'
+    if request.headers.get('If-None-Match') == etag:
+        return '', 304, {'ETag': etag}
+
+    response_data = {
+        'status': snap.status,
+        'progress': snap.progress,
+        'filename': snap.filename,
+        'error': snap.error,
+        'ffmpeg_available': job.ffmpeg_available,
+        'temp_dir': job.temp_dir,
+        'downloaded_bytes': snap.downloaded_bytes,
+        'total_bytes': snap.total_bytes,
+        'speed': snap.speed,
+        'eta': snap.eta,
+        'downloaded_mb': snap.downloaded_mb,
+        'total_mb': snap.total_mb,
+        'speed_mb': snap.speed_mb,
+        'eta_formatted': snap.eta_formatted
+    }
+
+    response = jsonify(response_data)
+    response.headers['ETag'] = etag
+    return response
+
+@app.route('/api/download-file/<job_id>')
+def download_file(job_id):
+    job = safe_get_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Download job not found'}), 404
+
+    if job.status != 'completed':
+        return jsonify({'error': 'File not ready', 'status': job.status, 'error_detail': job.error}), 400
+
+    # One stat resolves the recorded filename; the directory scan is the
+    # cold path for when yt-dlp renamed the output.
+    filename = job.filename
+    st = None
+    if filename:
+        try:
+            st = os.stat(filename)
+        except OSError:
+            st = None
+    if st is None:
+        candidate = find_final_file_in_dir(job.temp_dir, title_hint=job.title)
+        if candidate:
+            filename = candidate
+            try:
+                st = os.stat(filename)
+            except OSError:
+                st = None
+    if st is None:
+        return jsonify({'error': 'File not found on server'}), 404
+
+    # Security check: ensure file is within temp directory. realpath +
+    # commonpath resolves symlinks and avoids the startswith prefix bug
+    # (/tmp/foo matching /tmp/foobar).
+    try:
+        filename = os.path.realpath(filename)
+        temp_dir = os.path.realpath(job.temp_dir)
+        if os.path.commonpath([filename, temp_dir]) != temp_dir:
+            logger.error("Security violation: file %s not in temp dir %s", filename, temp_dir)
+            return jsonify({'error': 'Invalid file path'}), 403
+    except Exception as e:
+        logger.error("Error validating file path: %s", e)
+        return jsonify({'error': 'File path validation failed'}), 500
+
+    original_filename = os.path.basename(filename)
+    ext = original_filename.rpartition('.')[2].lower()
+    mimetype = _MIME_TYPES.get(ext, _DEFAULT_MIME)
+
+    # Keep the file around briefly for retries, then let the scheduler
+    # thread reclaim it.
+    request_job_cleanup(job_id)
+
+    if XACCEL_PREFIX:
+        # Hand delivery to nginx: the response carries only headers and
+        # nginx sendfile()s the body from its internal location, so the
+        # worker thread is free the moment the headers go out. The
+        # redirect URI must be percent-encoded - yt-dlp titles regularly
+        # contain spaces, '#', '?', and non-latin1 characters that would
+        # otherwise break header encoding or be misparsed by nginx.
+        response = Response(status=200, mimetype=mimetype)
+        response.headers['X-Accel-Redirect'] = (
+            f"{XACCEL_PREFIX.rstrip('/')}/{quote(os.path.relpath(filename, TMP_ROOT))}"
+        )
+        response.headers['Content-Disposition'] = _attachment_disposition(original_filename)
+        return response
+
+    # Pass the filesystem path (never a BytesIO): send_file then exposes a
+    # real fd through wsgi.file_wrapper, letting the WSGI server use
+    # sendfile(2) for a zero-copy page-cache -> socket transfer.
+    # conditional=True makes Werkzeug honor Range/If-Range so a dropped
+    # connection resumes instead of re-sending the whole file.
+    return send_file(filename, as_attachment=True, download_name=original_filename,
+                     mimetype=mimetype, conditional=True)
+
+# The uptime monitor polls / continuously; reuse the ISO timestamp
+# within the same second like CachedTimeFormatter does for log lines.
+_health_ts_cache = [0, '']
+
+def _health_timestamp():
+    second = int(time.time())
+    if second != _health_ts_cache[0]:
+        _health_ts_cache[1] = datetime.fromtimestamp(second).isoformat()
+        _health_ts_cache[0] = second
+    return _health_ts_cache[1]
+
+@app.route('/')
+def health_check():
+    """Health check endpoint with cookie status"""
+    cookies_configured = bool(YTDL_COOKIES_PATH and os.path.exists(YTDL_COOKIES_PATH))
+
+    # Read first few lines of cookies file for debugging
+    cookie_preview = None
+    if cookies_configured:
+        try:
+            with open(YTDL_COOKIES_PATH, 'r', encoding='utf-8') as f:
+                lines = f.readlines()[:5]  # First 5 lines
+                cookie_preview = ''.join(lines)
+        except Exception as e:
+            cookie_preview = f"Error reading file: {e}"
+
+    return jsonify({
+        'status': 'healthy',
+        'service': 'YTDL API Server',
+        'timestamp': _health_timestamp(),
+        'cookies_configured': cookies_configured,
+        'cookies_path': YTDL_COOKIES_PATH or 'Not set',
+        'cookies_preview': cookie_preview,
+        'ffmpeg_available': FFMPEG_AVAILABLE,
+        'active_jobs': len(download_status)
+    })
+
+@app.route('/api/debug-cookies')
+def debug_cookies():
+    """Debug endpoint to check cookies file"""
+    if not YTDL_COOKIES_PATH:
+        return jsonify({'error': 'YTDL_COOKIES_PATH not set'}), 400
+    
+    if not os.path.exists(YTDL_COOKIES_PATH):
+        return jsonify({'error': f'File not found: {YTDL_COOKIES_PATH}'}), 404
+    
+    try:
+        with open(YTDL_COOKIES_PATH, 'r', encoding='utf-8') as f:
+            content = f.read()
+        
+        lines = content.split('\n')
+        
+        return jsonify({
+            'file_path': YTDL_COOKIES_PATH,
+            'file_size': len(content),
+            'total_lines': len(lines),
+            'first_10_lines': lines[:10],
+            'has_netscape_header': 'Netscape' in content[:200],
+            'has_tabs': '\t' in content,
+            'encoding': 'utf-8'
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+if __name__ == '__main__':
+    print("\n" + "="*60)
+    print("🚀 YTDL API Server Starting...")
+    print("="*60)
+    
+    if not FFMPEG_AVAILABLE:
+        logger.warning("FFmpeg not found - some features will be limited.")
+        print("⚠️  Warning: FFmpeg not found. Some features may be limited.")
+    else:
+        logger.info("FFmpeg available - full functionality enabled.")
+        print("✅ FFmpeg is available - Full functionality enabled")
+
+    if YTDL_COOKIES_PATH:
+        if os.path.exists(YTDL_COOKIES_PATH):
+            print(f"✅ Cookies file found: {YTDL_COOKIES_PATH}")
+            logger.info("✅ Cookies file configured and found: %s", YTDL_COOKIES_PATH)
+        else:
+            print(f"❌ Cookies file NOT found at: {YTDL_COOKIES_PATH}")
+            print("   Please upload cookies.txt to fix bot detection errors!")
+            logger.error("❌ YTDL_COOKIES_PATH set but file not found: %s", YTDL_COOKIES_PATH)
+    else:
+        print("❌ YTDL_COOKIES_PATH not set in environment variables")
+        print("   Bot detection errors are likely - please configure cookies!")
+        logger.warning("❌ YTDL_COOKIES_PATH environment variable not set")
+
+    port = int(os.environ.get('PORT', 5000))
+    
+    print(f"\n✅ YTDL API Server starting on port {port}")
+    print("="*60 + "\n")
+    logger.info(f"YTDL API Server starting on port {port}")
+    
+    app.run(debug=False, host='0.0.0.0', port=port, use_reloader=False)
+
+
@@ -0,0 +1,18 @@
+"""Gunicorn configuration for the YTDL API server.
+
+Job state (download_status, the in-flight map, the video-info cache)
+lives in process memory, so the service must run as a single worker
+process; concurrency comes from gthread threads, which fits the
+I/O-bound yt-dlp endpoints. Bump threads before ever adding workers -
+multiple workers would each see their own job dict and break status
+polling.
+"""
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+workers = 1
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+timeout = 300  # downloads and info extraction are long-running
+graceful_timeout = 30
+accesslog = '-'